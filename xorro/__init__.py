@@ -12,123 +12,244 @@ main  -- Main function starting an extended clingo application.
 from . import util
 from . import transformer as _tf
 #from . import normal_form as _nf
-from .countp import CountCheckPropagator
-from .up import UnitPropagator
-from .gje_prop import Reason_GJE
-from .gje_prop_n import State_GJE
-from .gje_simplex import Simplex_GJE
-from .gje_xorsat import XorSat_GJE
-from .up_total import UPTotalPropagator
-from .tree_check import TreeCheckPropagator
-from random import sample
+import random
 import sys as _sys
-import os as _os
+from itertools import chain as _chain
+from array import array as _array
 import clingo as _clingo
 from textwrap import dedent as _dedent
 
-def translate_binary_xor(backend, lhs, rhs):
-    aux = backend.add_atom()
-    backend.add_rule([aux], [ lhs, -rhs])
-    backend.add_rule([aux], [-lhs,  rhs])
-    return aux
+_COUNT_PROGRAM = _dedent("""\
+    :- { __parity(ID,even,X) } = N, N\\2!=0, __parity(ID,even).
+    :- { __parity(ID,odd ,X) } = N, N\\2!=1, __parity(ID,odd).
+    """)
+
+_APPROACH_HELP = _dedent("""\
+    Approach to handle XOR constraints [count]
+          <arg>: {count|list|tree|countp|up|gje}
+            count      : Add count aggregates modulo 2
+            {list,tree}: Translate binary XOR operators to rules
+                         (binary operators are arranged in a balanced tree)
+            countp     : Propagator simply counting assigned literals
+            up         : Propagator implementing unit propagation
+            gje        : Propagator implementing Gauss-Jordan Elimination""")
+_CUTOFF_HELP   = "Percentage of literals assigned before GJE [0-1]"
+_SAMPLING_HELP = "Enable sampling by generating random XOR constraints"
+_S_HELP        = "Number of XOR constraints to generate. Default=0, log(#atoms)"
+_Q_HELP        = "Density of each XOR constraint. Default=0.5"
+_DISPLAY_HELP  = "Display the random XOR constraints used in sampling"
+_SPLIT_HELP    = "Split XOR constraints to smaller ones of size <n>. Default=0 (off) "
+_PRE_GJE_HELP  = "Enable GJE preprocessing for XOR constraints"
+_SEED_HELP     = "Seed for the random XOR constraints and the sampled answer sets. Default=random"
+
+_TREE_PLANS = {}
+
+def tree_plan(n):
+    """
+    Returns the shape of the balanced tree over n leaves as a list of pairs of
+    slot indexes. The leaves occupy the first n slots and every pair adds the
+    slot of a new binary XOR combining the given slots; the last one is the
+    root.
+
+    Plans only depend on the number of leaves and are built once per size.
+    """
+    plan = _TREE_PLANS.get(n)
+    if plan is None:
+        plan = []
+        layer = list(range(n))
+        while len(layer) > 1:
+            odd = layer[-1:] if len(layer) % 2 else []
+            pairs = list(zip(layer[0::2], layer[1::2]))
+            layer = list(range(n + len(plan), n + len(plan) + len(pairs))) + odd
+            plan.extend(pairs)
+        _TREE_PLANS[n] = plan
+    return plan
+
+def fold_facts(constraint, facts):
+    """
+    Returns the literals of the constraint that are not decided by the given
+    facts, which are literals known to be true, and whether an odd number of
+    the remaining literals has to be true.
+    """
+    odd = True
+    literals = []
+    for lit in constraint:
+        if lit in facts:
+            odd = not odd
+        elif -lit not in facts:
+            literals.append(lit)
+    return literals, odd
+
+def plan_trees(sizes):
+    """
+    Returns a dictionary mapping each of the given constraint sizes to its
+    tree plan. Planning does not depend on the backend; the slots of a plan
+    are placeholders for the literals of a constraint and fresh aux atoms.
+    """
+    return dict((n, tree_plan(n)) for n in set(sizes))
+
+def translate_constraints(backend, constraints, facts=()):
+    """
+    Adds rules to the backend requiring an odd number of literals of each
+    constraint to be true. Each constraint is a list of literals translated
+    into a balanced tree of binary XORs.
+
+    Literals decided by the given facts are folded into the parity of their
+    constraint beforehand, so no aux atoms are introduced for them.
+
+    Translation happens in two phases. First, the constraints are planned
+    independently of the backend. Then the placeholders of the plans are
+    resolved to the literals and fresh aux atoms as (aux, lhs, rhs) triples
+    and all rules are emitted in one loop. Literals, slots and triples are
+    kept in flat integer arrays.
+    """
+    add_atom, add_rule = backend.add_atom, backend.add_rule
+
+    ## Fold facts
+    if facts:
+        folded = []
+        for constraint in constraints:
+            literals, odd = fold_facts(constraint, facts)
+            if not literals:
+                if odd:
+                    add_rule([], [])
+                continue
+            if not odd:
+                literals[0] = -literals[0]
+            folded.append(_array("i", literals))
+        constraints = folded
+
+    ## Plan
+    plans = plan_trees(len(constraint) for constraint in constraints)
+
+    ## Resolve placeholders
+    triples, roots = _array("i"), _array("i")
+    for constraint in constraints:
+        slots = _array("i", constraint)
+        for l, r in plans[len(slots)]:
+            aux = add_atom()
+            triples.extend((aux, slots[l], slots[r]))
+            slots.append(aux)
+        roots.append(slots[-1])
+
+    ## Emit
+    it = iter(triples)
+    for aux, lhs, rhs in zip(it, it, it):
+        add_rule([aux], [ lhs, -rhs])
+        add_rule([aux], [-lhs,  rhs])
+    for root in roots:
+        add_rule([], [-root])
+
+def read_files(files, keep_xors=True):
+    """
+    Yields the contents of the given files one after the other, so that only
+    one file is in memory at a time. Reads from stdin if no files are given.
+    If keep_xors is false, lines with parity constraints are left out.
+
+    Every file is parsed as a whole because statements may span several lines.
+    """
+    if len(files) == 0:
+        yield _sys.stdin.read() if keep_xors else util.strip_xors(_sys.stdin)
+    for name in files:
+        with open(name) as f:
+            yield f.read() if keep_xors else util.strip_xors(f)
 
-def transform(prg, files):
+def transform(prg, files, extra_text="", keep_xors=True):
+    """
+    Transforms the given files followed by the additional program text.
+    """
     with prg.builder() as b:
-        files = [open(f) for f in files]
-        if len(files) == 0:
-            files.append(_sys.stdin)
-        _tf.transform((f.read() for f in files), b.add)
+        _tf.transform(_chain(read_files(files, keep_xors), [extra_text]), b.add)
 
 def normal_form(prg, files):
     with prg.builder() as b:
-        files = [open(f) for f in files]
-        if len(files) == 0:
-            files.append(_sys.stdin)
-        _nf.transform((f.read() for f in files), b.add)
+        _nf.transform(read_files(files), b.add)
         
-class Leaf:
-    def __init__(self, atom):
-        self.__atom = atom
-
-    def translate(self, backend):
-        return self.__atom
-
-class Tree:
-    def __init__(self, lhs, rhs):
-        self.__lhs = lhs
-        self.__rhs = rhs
-
-    def translate(self, backend):
-        lhs = self.__lhs.translate(backend)
-        rhs = self.__rhs.translate(backend)
-        return translate_binary_xor(backend, lhs, rhs)
-
-class List:
-    def __init__(self, literals):
-        assert(len(literals) > 0)
-        self.__literals = literals
+def _get_lit(atom):
+    """
+    Maps a symbolic atom to its program literal and True if it is a fact.
 
-    def translate(self, backend):
-        return util.reduce(lambda l, r: translate_binary_xor(backend, l, r), self.__literals)
+    Defined at module level, unlike the solver based util.default_get_lit, so
+    it is not recreated per call and can be pickled.
+    """
+    return atom.literal, True if atom.is_fact else None
+
+def _translate_count(prg, cutoff):
+    prg.add("__count", [], _COUNT_PROGRAM)
+    prg.ground([("__count", [])])
+
+## Propagators are imported by their handlers, only the selected one is loaded
+def _translate_countp(prg, cutoff):
+    from .countp import CountCheckPropagator
+    prg.register_propagator(CountCheckPropagator())
+
+def _translate_up(prg, cutoff):
+    from .up import UnitPropagator
+    prg.register_propagator(UnitPropagator())
+
+def _translate_gje_prop(prg, cutoff):
+    from .gje_prop import Reason_GJE
+    prg.register_propagator(Reason_GJE(cutoff))
+
+def _translate_gje_prop_n(prg, cutoff):
+    from .gje_prop_n import State_GJE
+    prg.register_propagator(State_GJE(cutoff))
+
+def _translate_gje_simplex(prg, cutoff):
+    from .gje_simplex import Simplex_GJE
+    prg.register_propagator(Simplex_GJE(cutoff))
+
+def _translate_gje_xorsat(prg, cutoff):
+    from .gje_xorsat import XorSat_GJE
+    prg.register_propagator(XorSat_GJE())
+
+def _translate_up_check(prg, cutoff):
+    from .up_total import UPTotalPropagator
+    prg.register_propagator(UPTotalPropagator())
+
+def _translate_tree_check(prg, cutoff):
+    from .tree_check import TreeCheckPropagator
+    prg.register_propagator(TreeCheckPropagator())
+
+def _translate_tree(prg, cutoff):
+    ## Nothing to translate without parity constraints
+    if not util.has_parity_constraints(prg.symbolic_atoms):
+        return
+
+    ret = util.symbols_to_xor_r(prg.symbolic_atoms, _get_lit)
+    with prg.backend() as b:
+        if ret is None:
+            b.add_rule([], [])
+        else:
+            constraints, facts = ret
+            add_rule = b.add_rule
+            for fact in facts:
+                add_rule([], [-fact])
+            translate_constraints(b, constraints, set(facts))
+
+_MODES = {
+    "count"      : _translate_count,
+    "list"       : _translate_tree,
+    "tree"       : _translate_tree,
+    "countp"     : _translate_countp,
+    "up"         : _translate_up,
+    "gje-prop"   : _translate_gje_prop,
+    "gje-prop-n" : _translate_gje_prop_n,
+    "gje-simplex": _translate_gje_simplex,
+    "gje-xorsat" : _translate_gje_xorsat,
+    "up-check"   : _translate_up_check,
+    "tree-check" : _translate_tree_check,
+}
 
 def translate(mode, prg, cutoff):
-    if mode == "count":
-        prg.add("__count", [], _dedent("""\
-            :- { __parity(ID,even,X) } = N, N\\2!=0, __parity(ID,even).
-            :- { __parity(ID,odd ,X) } = N, N\\2!=1, __parity(ID,odd).
-            """))
-        prg.ground([("__count", [])])
-
-    elif mode == "countp":
-        prg.register_propagator(CountCheckPropagator())
-
-    elif mode == "up":
-        prg.register_propagator(UnitPropagator())
-
-    elif mode == "gje-prop":
-        prg.register_propagator(Reason_GJE(cutoff))
-
-    elif mode == "gje-prop-n":
-        prg.register_propagator(State_GJE(cutoff))
-
-    elif mode == "gje-simplex":
-        prg.register_propagator(Simplex_GJE(cutoff))
-
-    elif mode == "gje-xorsat":
-        prg.register_propagator(XorSat_GJE())
-
-    elif mode == "up-check":
-        prg.register_propagator(UPTotalPropagator())
-
-    elif mode == "tree-check":
-        prg.register_propagator(TreeCheckPropagator())
-
-    elif mode in ["list", "tree"]:
-        def to_tree(constraint):
-            layer = [Leaf(literal) for literal in constraint]
-            def tree(l, r):
-                return l if r is None else Tree(l, r)
-            while len(layer) > 1:
-                layer = list(util.starmap(tree, util.zip_longest(layer[0::2], layer[1::2])))
-            return layer[0]
-
-        def get_lit(atom):
-            return atom.literal, True if atom.is_fact else None
-
-        ret = util.symbols_to_xor_r(prg.symbolic_atoms, get_lit)
-        with prg.backend() as b:
-            if ret is None:
-                b.add_rule([], [])
-            else:
-                constraints, facts = ret
-                for fact in facts:
-                    b.add_rule([], [-fact])
-                for constraint in constraints:
-                    tree = List(constraint) if mode == "list" else to_tree(constraint)
-                    b.add_rule([], [-tree.translate(b)])
-
-    else:
+    """
+    Translates the parity constraints of the grounded program with the given
+    mode, which is one of the keys of _MODES.
+    """
+    translate_mode = _MODES.get(mode)
+    if translate_mode is None:
         raise RuntimeError("unknow transformation mode: {}".format(mode))
+    translate_mode(prg, cutoff)
 
 class Application:
     """
@@ -153,13 +274,14 @@ class Application:
         self.__display  = _clingo.Flag(False)
         self.__split = 0
         self.__pre_gje  = _clingo.Flag(False)
+        self.__seed = None
 
     def __parse_approach(self, value):
         """
         Parse approach argument.
         """
         self.__approach = str(value)
-        return self.__approach in ["count", "list", "tree", "countp", "up", "gje-prop", "gje-prop-n", "gje-simplex", "gje-xorsat", "up-check", "tree-check"]
+        return self.__approach in _MODES
 
     def __parse_cutoff(self, value):
         """
@@ -188,6 +310,13 @@ class Application:
         """
         self.__split = int(value)
         return self.__split >=2
+
+    def __parse_seed(self, value):
+        """
+        Parse the seed for the random number generator used in sampling.
+        """
+        self.__seed = int(value)
+        return True
     
     def register_options(self, options):
         """
@@ -196,42 +325,34 @@ class Application:
 
         """
         group = "Xorro Options"
-        options.add(group, "approach", _dedent("""\
-        Approach to handle XOR constraints [count]
-              <arg>: {count|list|tree|countp|up|gje}
-                count      : Add count aggregates modulo 2
-                {list,tree}: Translate binary XOR operators to rules
-                             (binary operators are arranged in list/tree)
-                countp     : Propagator simply counting assigned literals
-                up         : Propagator implementing unit propagation
-                gje        : Propagator implementing Gauss-Jordan Elimination"""), self.__parse_approach)
+        options.add(group, "approach", _APPROACH_HELP, self.__parse_approach)
         
-        options.add(group, "cutoff", _dedent("""\
-        Percentage of literals assigned before GJE [0-1]"""), self.__parse_cutoff)
+        options.add(group, "cutoff", _CUTOFF_HELP, self.__parse_cutoff)
+
+        options.add_flag(group, "sampling", _SAMPLING_HELP, self.__sampling)
 
-        options.add_flag(group, "sampling", _dedent("""\
-        Enable sampling by generating random XOR constraints"""), self.__sampling)
+        options.add(group, "s", _S_HELP, self.__parse_s)
 
-        options.add(group, "s", _dedent("""\
-        Number of XOR constraints to generate. Default=0, log(#atoms)"""), self.__parse_s)
+        options.add(group, "q", _Q_HELP, self.__parse_q)
 
-        options.add(group, "q", _dedent("""\
-        Density of each XOR constraint. Default=0.5"""), self.__parse_q)
+        options.add_flag(group, "display", _DISPLAY_HELP, self.__display)
 
-        options.add_flag(group, "display", _dedent("""\
-        Display the random XOR constraints used in sampling"""), self.__display)
+        options.add(group, "split", _SPLIT_HELP, self.__parse_split)
 
-        options.add(group, "split", _dedent("""\
-        Split XOR constraints to smaller ones of size <n>. Default=0 (off) """), self.__parse_split)
+        options.add_flag(group, "pre-gje", _PRE_GJE_HELP, self.__pre_gje)
 
-        options.add_flag(group, "pre-gje", _dedent("""\
-        Enable GJE preprocessing for XOR constraints"""), self.__pre_gje)
+        options.add(group, "sampling-seed", _SEED_HELP, self.__parse_seed)
 
     def main(self, prg, files):
         """
         Implements the rewriting and solving loop.
         """
-        models = []
+        on_model = None
+        ## Program text added after the input files, e.g. random or rewritten XORs
+        extra_text = ""
+        keep_xors = True
+        ## Set if preprocessing shows that the parity constraints have no solution
+        inconsistent = False
 
         """
         Transform each input parity constraints into their normal-form
@@ -247,105 +368,104 @@ class Application:
         """
         
         if self.__sampling.value:
-            selected = []
+            rand = random.Random(self.__seed)
             requested_models = int(str(prg.configuration.solve.models))
             prg.configuration.solve.models = 0
 
+            ## Sample while solving, keep all answer sets only if all are requested
+            if requested_models == -1:
+                requested_models = 1
+            on_model = util.Reservoir(requested_models if requested_models > 0 else None, rand)
+
             s = self.__s
             q = self.__q
 
             cl = _clingo.Control()
-            xors = util.generate_random_xors(cl, files, s, q)
-            if self.__display.value:
-                print(xors)
-            files.append("examples/__temp_xors.lp")
-
-        """
-        GJE preprocessing
-        """
-        if self.__pre_gje.value:
-            print("Performing GJE preprocessing")
-            cl = _clingo.Control()
-            xors_lits, xors_parities, all_lits = util.get_xors(cl, files)
-            prepro_xors, prepro_pars = util.pre_gje(xors_lits, xors_parities, all_lits, self.__display.value)
-
-            xors = ""
-            for i in range(len(prepro_xors)):
-                xors = util.build_theory_atoms(xors,prepro_xors[i], prepro_pars[i])
+            xors = util.generate_random_xors(cl, files, s, q, rand)
             if self.__display.value:
-                ## Display all the XORs after the GJE preprocessing
-                print("Simplified parity constraints after GJE")
                 print(xors)
+            extra_text = xors
 
-            ## Update the files
-            files = util.write_file("examples/__pre_gje_.lp", files, xors, "")
-            ## Remove the file
-            
         """
-        Split preprocessing
+        Preprocessing
+        Parity constraints are parsed once and both passes work on them in memory.
+        The rewritten parity constraints replace the original ones in memory.
         """
-        if self.__split >=2:
-            print("Splitting XORs")
-            choice_rule = [None]
+        if self.__pre_gje.value or self.__split >= 2:
             cl = _clingo.Control()
-            xors_lits, xors_parities, all_lits = util.get_xors(cl, files)
-
-            if self.__display.value:
-                print("Total number of XORs: %s"%len(xors_lits))
-
-            prepro_xors, prepro_pars, choice_rule, splitted = util.split(xors_lits, xors_parities, self.__split, self.__display.value)
-
-            xors = ""
-            for i in range(len(prepro_xors)):
-                xors = util.build_theory_atoms(xors,prepro_xors[i], prepro_pars[i])
-            if self.__display.value:
-                if splitted:
-                    ## Display all the XORs after the split
-                    print("")
-                    print("Splitted parity constraints")
+            xors_lits, xors_parities, all_lits = util.get_xors(cl, files, extra_text)
+            choice_rule = []
+            rewritten = False
+
+            """
+            GJE preprocessing
+            """
+            if self.__pre_gje.value:
+                print("Performing GJE preprocessing")
+                xors_lits, xors_parities = util.pre_gje(xors_lits, xors_parities, all_lits, self.__display.value)
+
+                if xors_lits is None:
+                    print("GJE preprocessing found the parity constraints unsatisfiable")
+                    inconsistent = True
                 else:
-                    print("")
-                    print("No parity constraint was split")
-                print(xors)
-                for choice in choice_rule:
-                    print(choice)
-
-            if splitted:
-                ## Update the files
-                files = util.write_file("examples/__split_.lp", files, xors, choice_rule)
+                    rewritten = True
+                    if self.__display.value:
+                        ## Display all the XORs after the GJE preprocessing
+                        print("Simplified parity constraints after GJE")
+                        print(util.build_xors(xors_lits, xors_parities))
+
+            """
+            Split preprocessing
+            """
+            if self.__split >=2 and not inconsistent:
+                print("Splitting XORs")
+                if self.__display.value:
+                    print("Total number of XORs: %s"%len(xors_lits))
+
+                xors_lits, xors_parities, choice_rule, splitted = util.split(xors_lits, xors_parities, self.__split, self.__display.value)
+                rewritten = rewritten or splitted
+
+                if self.__display.value:
+                    if splitted:
+                        ## Display all the XORs after the split
+                        print("")
+                        print("Splitted parity constraints")
+                    else:
+                        print("")
+                        print("No parity constraint was split")
+                    print(util.build_xors(xors_lits, xors_parities))
+                    for choice in choice_rule:
+                        print(choice)
+
+            if rewritten:
+                ## Drop the original parity constraints and add the rewritten ones
+                extra_text = util.build_xors(xors_lits, xors_parities) + "".join(choice_rule)
+                keep_xors = False
         
         """
         Standard xorro workflow
         """
-        transform(prg,files)
-        prg.ground([("base", [])])
-        translate(self.__approach, prg, self.__cutoff)
-        ret = prg.solve(None, lambda model: models.append(model.symbols(shown=True)))
-
-        ## Remove temp files
-        if _os.path.exists("examples/__pre_gje_.lp"):
-            _os.remove("examples/__pre_gje_.lp")
-        if _os.path.exists("examples/__split_.lp"):
-            _os.remove("examples/__split_.lp")
-        
+        if inconsistent:
+            ## Nothing to ground or translate, solving just reports UNSAT
+            prg.add("base", [], ":- #true.")
+            prg.ground([("base", [])])
+        else:
+            transform(prg, files, extra_text, keep_xors)
+            prg.ground([("base", [])])
+            translate(self.__approach, prg, self.__cutoff)
+        ret = prg.solve(None, on_model)
+
         """
         Sample from all answer sets remaining in the cluster
         """
-        if self.__sampling.value:            
-            _os.remove("examples/__temp_xors.lp")
-            if requested_models == -1:
-                requested_models = 1
-            elif requested_models == 0:
-                requested_models = len(models)
+        if self.__sampling.value:
             if str(ret) == "SAT":
-                if requested_models > len(models):
-                    requested_models = len(models)
-                selected = sorted(sample(range(1, len(models)+1), requested_models))
+                selected = sorted(on_model.samples, key=lambda answer: answer[0])
                 print("")
-                print("Sampled Answer Set(s): %s"%str(selected)[1:-1])
-                for i in range(requested_models):
-                    print("Answer: %s"%selected[i])
-                    print(' '.join(map(str, sorted(models[selected[i]-1]))))
+                print("Sampled Answer Set(s): %s"%", ".join(str(number) for number, _ in selected))
+                for number, symbols in selected:
+                    print("Answer: %s"%number)
+                    print(' '.join(map(str, sorted(symbols))))
 
 def main():
     """
@@ -1,6 +1,9 @@
 """
 This module contains all the methods to perform Gauss Jordan Elimination. 
 
+Classes:
+PackedMatrix -- Bit-packed matrix used by the propagators during search
+
 Functions:
 For pre process
 columns_state_to_matrix -- Transform the state of columns to a single matrix including the parity column
@@ -13,9 +16,20 @@ xor  -- Sub module for GJE to xor rows
 
 check_sat      -- Check satisfiability after performing GJE
 deduced_clause -- Obtain implications after GJE
+
+For bit-packed GJE
+pack_                                       -- Transform a binary matrix to a bit-packed matrix
+xors_to_packed_                             -- Build a bit-packed matrix from xor constraints
+unpack_                                     -- Transform a bit-packed matrix to a binary matrix
+perform_gauss_jordan_elimination_packed_    -- Entire GJE process on a bit-packed matrix
+reduce_matrix_packed_                       -- Entire GJE process on a binary matrix through its bit-packed form
+check_rref_packed_                          -- Check satisfiability and obtain implications after GJE
 """
 
-import numpy as np
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def print_matrix(m):
     for row in m:
@@ -280,3 +294,191 @@ def perform_gauss_jordan_elimination_(m, show):
         print_matrix(m)
         
     return m
+
+
+"""
+Bit-packed methods using numpy.
+Each row stores 64 columns per uint64 word and the parity column is kept
+apart, so adding two rows is a single XOR over their words. If numba is
+available, the elimination is compiled on its first use.
+"""
+def words_(cols):
+    """ Number of uint64 words needed to store cols columns """
+    return (cols + 63) // 64
+
+def bit_(col):
+    """ Mask selecting the given column inside its word """
+    return np.uint64(1) << np.uint64(col % 64)
+
+def get_bit_(m, col):
+    """ Values of the given column in all the rows of a bit-packed matrix """
+    return ((m[:, col // 64] >> np.uint64(col % 64)) & np.uint64(1)).astype(np.uint8)
+
+def pack_(m):
+    """ Transform a binary matrix (without the parity column) into a bit-packed matrix """
+    m = np.asarray(m, dtype=np.uint8)
+    rows, columns = np.nonzero(m)
+
+    packed = np.zeros((m.shape[0], words_(m.shape[1])), dtype=np.uint64)
+    np.bitwise_or.at(packed, (rows, columns // 64), np.uint64(1) << (columns % 64).astype(np.uint64))
+    return packed
+
+def xors_to_packed_(xors, index, cols):
+    """ Build the bit-packed matrix of the xors. The index maps each literal to its column """
+    rows, columns = [], []
+    for i in range(len(xors)):
+        for lit in xors[i]:
+            rows.append(i)
+            columns.append(index[lit])
+    columns = np.array(columns, dtype=np.intp)
+
+    m = np.zeros((len(xors), words_(cols)), dtype=np.uint64)
+    np.bitwise_or.at(m, (np.array(rows, dtype=np.intp), columns // 64), np.uint64(1) << (columns % 64).astype(np.uint64))
+    return m
+
+def unpack_(m, cols):
+    """ Transform a bit-packed matrix into a binary matrix with cols columns """
+    columns = np.arange(cols)
+    m = np.asarray(m, dtype=np.uint64)
+    return ((m[:, columns // 64] >> (columns % 64).astype(np.uint64)) & np.uint64(1)).astype(np.uint8)
+
+def _gje_eliminate_loops(m, parities, cols):
+    """ GJE kernel on bit-packed rows written as plain loops to be compiled by numba """
+    rows, words = m.shape
+    one = np.uint64(1)
+    r = 0
+    for c in range(cols):
+        if r == rows:
+            break
+        w, b = c // 64, np.uint64(c % 64)
+
+        ## Check Pivot
+        pivot = -1
+        for i in range(r, rows):
+            if (m[i, w] >> b) & one:
+                pivot = i
+                break
+        if pivot < 0: ## No pivot in this column, move to the next one
+            continue
+        if pivot != r: ## Swap, words before the pivot word are zero in both rows
+            for k in range(w, words):
+                m[r, k], m[pivot, k] = m[pivot, k], m[r, k]
+            parities[r], parities[pivot] = parities[pivot], parities[r]
+
+        ## XOR all the other rows having a one in the pivot column
+        for i in range(rows):
+            if i != r and (m[i, w] >> b) & one:
+                for k in range(w, words):
+                    m[i, k] ^= m[r, k]
+                parities[i] ^= parities[r]
+        r += 1
+
+    return r
+
+def _gje_eliminate_numpy(m, parities, cols):
+    """ GJE kernel on bit-packed rows using numpy operations on whole rows """
+    rows = len(m)
+    r = 0
+    for c in range(cols):
+        if r == rows:
+            break
+        w, b = c // 64, bit_(c)
+
+        ## Check Pivot
+        ones = np.flatnonzero(m[r:, w] & b)
+        if ones.size == 0: ## No pivot in this column, move to the next one
+            continue
+        pivot = r + ones[0]
+        if pivot != r: ## Swap
+            m[[r, pivot]] = m[[pivot, r]]
+            parities[[r, pivot]] = parities[[pivot, r]]
+
+        ## XOR all the other rows having a one in the pivot column
+        mask = (m[:, w] & b).astype(bool)
+        mask[r] = False
+        m[mask] ^= m[r]
+        parities[mask] ^= parities[r]
+        r += 1
+
+    return r
+
+def _build_gje_eliminate():
+    """ GJE kernel compiled by numba, or the numpy kernel if numba is not available """
+    try:
+        from numba import njit
+    except ImportError:
+        return _gje_eliminate_numpy
+    return njit(cache=True)(_gje_eliminate_loops)
+
+## Built on the first elimination, so importing does not load numba
+_gje_eliminate = None
+
+def perform_gauss_jordan_elimination_packed_(m, parities, cols):
+    """
+    Perform GJE in place on a bit-packed matrix and its parity vector.
+    The matrix is left in Reduced Row Echelon Form and its rank is returned.
+    """
+    global _gje_eliminate
+    if _gje_eliminate is None:
+        _gje_eliminate = _build_gje_eliminate()
+    return _gje_eliminate(m, parities, cols)
+
+def reduce_matrix_packed_(m):
+    """ Perform GJE on a binary list matrix including the parity column through its bit-packed form """
+    cols = len(m[0]) - 1
+    matrix = np.array(m, dtype=np.uint8)
+    packed, parities = pack_(matrix[:, :-1]), matrix[:, -1].copy()
+    perform_gauss_jordan_elimination_packed_(packed, parities, cols)
+    return np.column_stack((unpack_(packed, cols), parities)).tolist()
+
+def check_rref_packed_(m, parities, rank, lits):
+    """
+    Check the satisfiability of a bit-packed matrix in Reduced Row Echelon Form and get implications if no conflict.
+    Rows after the rank are empty, so an odd one means UNSAT. Rows with a single one are unit XORs.
+    """
+    if parities[rank:].any():
+        return True, []
+
+    clause = []
+    m = m[:rank]
+    unit = ((m != 0).sum(axis=1) == 1) & ((m & (m - np.uint64(1))) == 0).all(axis=1)
+    for i in np.flatnonzero(unit):
+        w = np.flatnonzero(m[i])[0]
+        lit = lits[64 * w + int(m[i, w]).bit_length() - 1]
+        clause.append(lit if parities[i] == 1 else -lit)
+    return False, clause
+
+class PackedMatrix:
+    """
+    Bit-packed matrix of the xor constraints with the parity column kept apart.
+    Columns correspond to the given literals. Before each elimination, the
+    columns of assigned literals are masked out on a preallocated buffer and
+    the true ones are added to the parities.
+    """
+    def __init__(self, matrix, parities, lits):
+        self.__lits = lits
+        self.__cols = len(lits)
+        self.__matrix = pack_(np.array(matrix, dtype=np.uint8).reshape(len(parities), len(lits)))
+        self.__parities = np.array(parities, dtype=np.uint8)
+        self.__buffer = np.empty_like(self.__matrix)
+
+    def literals(self):
+        return self.__lits
+
+    def solve(self, true, unassigned):
+        """
+        Perform GJE on the columns of the unassigned literals once the columns
+        of the true literals are added to the parities. Both are given as
+        column indexes. Returns the conflict flag and the implied literals.
+        """
+        parities = self.__parities.copy()
+        for col in true:
+            parities ^= get_bit_(self.__matrix, col)
+
+        mask = np.zeros(words_(self.__cols), dtype=np.uint64)
+        unassigned = np.array(unassigned, dtype=np.intp)
+        np.bitwise_or.at(mask, unassigned // 64, np.uint64(1) << (unassigned % 64).astype(np.uint64))
+        np.bitwise_and(self.__matrix, mask, out=self.__buffer)
+
+        rank = perform_gauss_jordan_elimination_packed_(self.__buffer, parities, self.__cols)
+        return check_rref_packed_(self.__buffer, parities, rank, self.__lits)
@@ -62,33 +62,41 @@ class XOR:
                 return True
         return False
 
-    def reason_gje(self, columns, assignment, n_lits, cutoff):
-        state = {}
+    def reason_gje(self, columns, matrix, assignment, n_lits, cutoff):
         partial = []
         deduced_literals = []
+        true = []
+        unassigned = []
 
         ## Get Partial Assignment
-        state["parity"] = columns["parity"]
-        for lit, column in columns.items():
-            if lit != "parity":
-                value = assignment.value(lit)
-                if value == None:
-                    state[lit] = column
-                elif value == True:
-                    state["parity"] = xor_columns(column, state["parity"])
-                    partial.append( lit)
-                elif value == False:                    
-                    partial.append(-lit)                           
-
-        ## Build the matrix from columns state
-        matrix, xor_lits= gje.columns_state_to_matrix(state)
+        lits = matrix.literals()
+        for col in range(len(lits)):
+            lit = lits[col]
+            value = assignment.value(lit)
+            if value == None:
+                unassigned.append(col)
+            elif value == True:
+                partial.append( lit)
+                true.append(col)
+            elif value == False:                    
+                partial.append(-lit)                           
 
         ## Percentage of assigned literals
-        assigned_lits_perc = 1.0-float("%.1f"%(len(xor_lits)/n_lits))
-        ## If there are more than unary xors perform GJE
-        if len(state) > 2 and assigned_lits_perc >= cutoff:
-            matrix = gje.remove_rows_zeros(matrix)
-            matrix = gje.perform_gauss_jordan_elimination(matrix, False)
+        assigned_lits_perc = 1.0-float("%.1f"%(len(unassigned)/n_lits))
+        ## If there are more than unary xors perform GJE on the bit-packed matrix
+        if len(unassigned) >= 2 and assigned_lits_perc >= cutoff:
+            ## Check SATISFIABILITY and imply literals
+            conflict, deduced_literals = matrix.solve(true, unassigned)
+            return conflict, partial, deduced_literals
+
+        ## Build the matrix from columns state
+        state = {}
+        state["parity"] = columns["parity"]
+        for col in true:
+            state["parity"] = xor_columns(columns[lits[col]], state["parity"])
+        for col in unassigned:
+            state[lits[col]] = columns[lits[col]]
+        matrix, xor_lits = gje.columns_state_to_matrix(state)
 
         ## Check SATISFIABILITY
         conflict = gje.check_sat(matrix)
@@ -103,6 +111,7 @@ class Reason_GJE:
     def __init__(self, cutoff):
         self.__states  = []
         self.__columns = []
+        self.__matrices = []
         self.__sat = True
         self.__consequences = []
         self.__cutoff = cutoff
@@ -179,6 +188,13 @@ class Reason_GJE:
                 
                 for thread_id in range(init.number_of_threads):
                     self.__columns[thread_id] = lits_to_binary(self.__columns[thread_id], sorted(literals), constraint)
+
+            ## Bit-pack the matrix of each thread
+            for thread_id in range(init.number_of_threads):
+                columns = self.__columns[thread_id]
+                lits = sorted(literals)
+                matrix = [[columns[lit][i] for lit in lits] for i in range(len(constraints))]
+                self.__matrices.append(gje.PackedMatrix(matrix, columns.get("parity", []), lits))
                     
         else:
             # NOTE: if the propagator is to be used standalone, this case has to be handled
@@ -212,6 +228,7 @@ class Reason_GJE:
         """
         state = self.__states[control.thread_id]
         columns = self.__columns[control.thread_id]
+        matrix = self.__matrices[control.thread_id]
         n = self.__n_literals
         cutoff = self.__cutoff
         counter = self.__counter
@@ -234,7 +251,7 @@ class Reason_GJE:
                     state[variable].append((xor, unassigned))                                                           
                     
                     ## GJE
-                    conflict, partial, clause = xor.reason_gje(columns, control.assignment, n, cutoff)
+                    conflict, partial, clause = xor.reason_gje(columns, matrix, control.assignment, n, cutoff)
                     if clause is not None:
                         for lit in clause:
                             if not control.add_nogood(partial+[-lit]) or not control.propagate():
@@ -2,7 +2,6 @@ from . import util
 from . import gje
 from itertools import chain
 import clingo
-import numpy as np
 
 class List:
     """
@@ -60,42 +59,26 @@ class XOR:
                 return True
         return False
 
-    def reason_gje(self, columns, assignment, cutoff):
-        state = {}
-        parities = columns["parity"]
+    def reason_gje(self, matrix, assignment, cutoff):
         partial = []
+        true = []
+        unassigned = []
 
         ## Get Partial Assignment
-        for key, value in columns.items():
-            if key != "parity":
-                assign = assignment.value(key)
-                if assign == None:
-                    state[key] = value
-                elif assign == True:
-                    parities = gje.xor_(value._List__list, parities)
-                    partial.append( key)
-                elif assign == False:
-                    partial.append(-key)
-        
-        ## Build the matrix from columns state
-        xor_lits = [ lit for lit in state ]
-        m = [ col._List__list for col in state.values()]
-        m.append(parities)
-        matrix = np.array(m).T
-
+        lits = matrix.literals()
+        for col in range(len(lits)):
+            assign = assignment.value(lits[col])
+            if assign == None:
+                unassigned.append(col)
+            elif assign == True:
+                true.append(col)
+                partial.append( lits[col])
+            elif assign == False:
+                partial.append(-lits[col])
+
+        ## Perform GJE on the bit-packed columns of the unassigned literals
         ## Check SATISFIABILITY and find consequences
-        conflict, clause = gje.check_sat_(matrix, xor_lits)
-        ## Detect conflict or clauses before GJE
-        if conflict:
-            return conflict, partial, clause
-        
-        ## If there are more than unary xors perform GJE
-        if len(matrix[0]) > 2 and len(parities)>1:
-            matrix = gje.remove_rows_zeros_(matrix)
-            matrix = gje.perform_gauss_jordan_elimination_(matrix, False)
-
-            ## Check SATISFIABILITY and find consequences
-            conflict, clause = gje.check_sat_(matrix, xor_lits)
+        conflict, clause = matrix.solve(true, unassigned)
 
         return conflict, partial, clause
 
@@ -103,7 +86,7 @@ class XOR:
 class State_GJE:
     def __init__(self, cutoff):
         self.__states   = []
-        self.__columns  = []
+        self.__matrices = []
         self.__literals = []
         self.__sat = True
         self.__consequences = []
@@ -130,7 +113,6 @@ class State_GJE:
         """
         for thread_id in range(len(self.__states), init.number_of_threads):
             self.__states.append({})
-            self.__columns.append({})
 
         init.check_mode = clingo.PropagatorCheckMode.Fixpoint
 
@@ -176,20 +158,13 @@ class State_GJE:
             # Sort literals
             self.__literals = List(sorted(literals))
             
-            # Add parities to the state
-            for thread_id in range(init.number_of_threads):
-                self.__columns[thread_id]["parity"] = List(np.array(pars))
-                
             # Build the rest of the matrix
             matrix = []
             for constraint in constraints:
                 matrix.append(gje.lits_to_binary_(constraint, literals))
 
-            # Transpose
-            matrix = np.array(matrix).T
-            for thread_id in range(init.number_of_threads):
-                for i in range(len(literals)):
-                    self.__columns[thread_id][literals[i]] = List(matrix[i])
+            # Bit-pack the matrix of each thread
+            self.__matrices = [gje.PackedMatrix(matrix, pars, literals) for thread_id in range(init.number_of_threads)]
             
         else:
             # NOTE: if the propagator is to be used standalone, this case has to be handled
@@ -223,7 +198,7 @@ class State_GJE:
         literals from the current decision level).
         """
         state     = self.__states[control.thread_id]
-        columns   = self.__columns[control.thread_id]
+        matrix    = self.__matrices[control.thread_id]
         cutoff    = self.__cutoff
         
         for literal in changes:
@@ -243,7 +218,7 @@ class State_GJE:
                     state[variable].append((xor, unassigned))                                                           
                     
                     ## GJE
-                    conflict, partial, clause = xor.reason_gje(columns, control.assignment, cutoff)
+                    conflict, partial, clause = xor.reason_gje(matrix, control.assignment, cutoff)
                     if conflict:
                         if not control.add_nogood(partial):
                             return
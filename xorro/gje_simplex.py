@@ -349,8 +349,8 @@ class Simplex_GJE:
                     self.__matrix.append(row)
 
                 # Preprocess by reducing the matrix to Reduced Row Echelon Form
-                ## Reduce
-                self.__matrix = gje.perform_gauss_jordan_elimination(self.__matrix,False)
+                ## Reduce on bit-packed rows
+                self.__matrix = gje.reduce_matrix_packed_(self.__matrix)
 
                 ## Rebuild XORs after initial GJE
                 ## Check cases if XORs of size 1, 2 or greater or equal than 3.
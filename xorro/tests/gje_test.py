@@ -3,6 +3,7 @@ Gauss-Jordan Tests Suite
 """
 import xorro
 from xorro import gje
+from xorro import util
 from xorro import gje_simplex as simplex
 import numpy as np
 
@@ -42,6 +43,23 @@ def solve_gje(m, show):
         m = gje.perform_gauss_jordan_elimination(m, show)
     return m
 
+def pre_gje(xors, parities, lits):
+    ## GJE preprocessing over the literal names
+    return util.pre_gje(xors, parities, lits, False)
+
+def solve_gje_packed_(m, lits):
+    ## GJE on the bit-packed rows, then check the result
+    cols = len(m[0])-1
+    m = np.array(m, dtype=np.uint8)
+    matrix, parities = gje.pack_(m[:, :-1]), m[:, -1].copy()
+    rank = gje.perform_gauss_jordan_elimination_packed_(matrix, parities, cols)
+    return np.column_stack((gje.unpack_(matrix, cols), parities)).tolist(), gje.check_rref_packed_(matrix, parities, rank, lits)
+
+def solve_packed_matrix(m, lits, true, unassigned):
+    ## GJE on the columns of the unassigned literals of a packed matrix
+    m = np.array(m, dtype=np.uint8)
+    return gje.PackedMatrix(m[:, :-1], m[:, -1], lits).solve(true, unassigned)
+
 def solve_gje_(m, show):
     ## If there are more than unary xors perform GJE
     if len(m[0]) > 2:
@@ -534,3 +552,77 @@ def test_remove_col(self):
     self.assertEqual(mm.__remove_col__(2),
                      [[1, 0, 1, 1, 0, 1],
                       [0, 1, 0, 1, 1, 0]])
+
+
+"""
+GJE Preprocessing on bit-packed rows
+"""
+def test_pre_gje(self):
+    self.assertEqual(pre_gje([['a','c','d','f'],
+                              ['c','d','e','f']], [1, 0], ['a','b','c','d','e','f','g','h']),
+                     ([['a','e'],
+                       ['c','d','e','f']], [1, 0]))
+
+    self.assertEqual(pre_gje([['a','b'],
+                              ['b','c'],
+                              ['a','c']], [1, 1, 1], ['a','b','c']),
+                     (None, None))
+
+    self.assertEqual(pre_gje([['a','b'],
+                              ['b','c'],
+                              ['a','c']], [1, 1, 0], ['a','b','c']),
+                     ([['a','c'],
+                       ['b','c'],
+                       []], [0, 1, 0]))
+
+    ## More than 64 literals spread the rows over several words
+    lits = ["p(%s)"%i for i in range(130)]
+    self.assertEqual(pre_gje([lits[60:70]+[lits[129]],
+                              lits[65:70]],  [0, 1], lits),
+                     ([lits[60:65]+[lits[129]],
+                       lits[65:70]], [1, 1]))
+
+
+"""
+GJE on bit-packed rows as used during search
+"""
+def test_gje_packed(self):
+    self.assertEqual(solve_gje_packed_([[1, 0, 1, 0, 1, 0],
+                                        [1, 1, 1, 0, 0, 1],
+                                        [0, 0, 1, 0, 1, 1],
+                                        [0, 1, 0, 1, 0, 0],
+                                        [0, 0, 0, 1, 0, 0]], [2,3,4,5,6]),
+                     ([[1, 0, 0, 0, 0, 1],
+                       [0, 1, 0, 0, 0, 0],
+                       [0, 0, 1, 0, 0, 0],
+                       [0, 0, 0, 1, 0, 0],
+                       [0, 0, 0, 0, 1, 1]], (False, [2,-3,-4,-5,6])))
+
+    self.assertEqual(solve_gje_packed_([[0, 1, 1, 0],
+                                        [1, 0, 1, 1],
+                                        [1, 1, 0, 0]], [2,3,4]),
+                     ([[1, 0, 1, 1],
+                       [0, 1, 1, 0],
+                       [0, 0, 0, 1]], (True, [])))
+
+    self.assertEqual(solve_gje_packed_([[1, 1, 0, 1],
+                                        [0, 0, 1, 1],
+                                        [1, 1, 1, 0]], [2,3,4]),
+                     ([[1, 1, 0, 1],
+                       [0, 0, 1, 1],
+                       [0, 0, 0, 0]], (False, [4])))
+
+    ## Unit XOR beyond the first word
+    lits = list(range(2, 72))
+    m = [[0]*70+[1], [0]*70+[0]]
+    m[0][0], m[0][69], m[1][0] = 1, 1, 1
+    self.assertEqual(solve_gje_packed_(m, lits)[1], (False, [-2, 71]))
+
+    ## Assigned literals are removed from the matrix
+    self.assertEqual(solve_packed_matrix([[1, 1, 0, 1],
+                                          [0, 1, 1, 0]], [2,3,4], [0], [1,2]),
+                     (False, [-3,-4]))
+
+    self.assertEqual(solve_packed_matrix([[1, 1, 0, 1],
+                                          [1, 1, 0, 0]], [2,3,4], [], [0,1,2]),
+                     (True, []))
@@ -3,6 +3,7 @@ import sys
 import xorro
 from xorro import transformer
 import clingo
+import tempfile
 from textwrap import dedent
 from . import gje_test
 
@@ -32,11 +33,18 @@ def solve(s, mode):
     models.sort()
     return models
 
+def run_main(s, args):
+    ## Run the application quietly on the program and return clingo's exit code
+    with tempfile.NamedTemporaryFile("w", suffix=".lp") as f:
+        f.write(s)
+        f.flush()
+        return clingo.clingo_main(xorro.Application("xorro"), args + ["--outf=3", f.name])
+
 
 class TestProgramTransformer(TestCase):
 
 
-    modes = ["count", "list", "tree", "countp", "up", "gje-prop", "gje-simplex", "gje-xorsat" ]
+    modes = ["count", "list", "tree", "countp", "up", "gje-prop", "gje-prop-n", "gje-simplex", "gje-xorsat" ]
 
     def test_trivial(self):
         for mode in TestProgramTransformer.modes:
@@ -80,6 +88,12 @@ class TestProgramTransformer(TestCase):
             if mode != "count":
                 self.assertEqual(solve(prg, mode), models)
 
+    def test_pre_gje_unsat(self):
+        ## Exit code 20 means UNSAT
+        prg = "{a;b;c}. &odd{a:a;b:b}. &odd{b:b;c:c}. &odd{a:a;c:c}."
+        for mode in TestProgramTransformer.modes:
+            self.assertEqual(run_main(prg, ["--pre-gje", "--approach=%s"%mode]), 20)
+
 
     ## Gauss-Jordan Elimination Tests
     def test_columns_state_to_matrix(self):
@@ -124,3 +138,8 @@ class TestProgramTransformer(TestCase):
     def test_remove_col(self):
         gje_test.test_remove_col(self)
 
+    def test_pre_gje(self):
+        gje_test.test_pre_gje(self)
+
+    def test_gje_packed(self):
+        gje_test.test_gje_packed(self)
@@ -4,9 +4,14 @@ from functools import *
 import sys
 from textwrap import dedent as _dedent
 from math import log
-from random import randint, sample
+import random
 from . import gje
 
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
 
 def attrdef(m, a, b):
     return getattr(m, a if hasattr(m, a) else b)
@@ -37,11 +42,51 @@ def build_theory_atoms(out_str, xor, parity):
     out_str  += "&%s{ %s }.\n"%(get_str_parity(parity), terms)
     return out_str
 
+def build_xors(xors, parities):
+    """
+    Returns the given xor constraints as theory atoms, one per line.
+    """
+    out_str = ""
+    for i in range(len(xors)):
+        out_str = build_theory_atoms(out_str, xors[i], parities[i])
+    return out_str
+
+class Reservoir:
+    """
+    Keeps a uniform random sample of at most k models seen so far using
+    reservoir sampling (Algorithm R). If k is None, all models are kept.
+
+    Samples are pairs of the answer number and the shown symbols of a model.
+    Symbols are only copied for models entering the sample. Random choices
+    are made with the given generator.
+    """
+    def __init__(self, k, rand=random):
+        self.__k = k
+        self.__n = 0
+        self.__rand = rand
+        self.samples = []
+
+    def __call__(self, model):
+        self.__n += 1
+        if self.__k is None or len(self.samples) < self.__k:
+            self.samples.append((self.__n, model.symbols(shown=True)))
+        else:
+            j = self.__rand.randrange(self.__n)
+            if j < self.__k:
+                self.samples[j] = (self.__n, model.symbols(shown=True))
+
 class _XORConstraint:
     def __init__(self, parity):
         self.parity = parity
         self.literals = set()
 
+def has_parity_constraints(symbolic_atoms):
+    """
+    Returns true if the domain has the predicate __parity/2, i.e., if there is
+    at least one parity constraint. Only the signatures are inspected.
+    """
+    return any(name == "__parity" and arity == 2 for name, arity, positive in symbolic_atoms.signatures)
+
 def symbols_to_xor_r(symbolic_atoms, get_lit):
     """
     Returns None if the constraints are trivially unsatisfiable, otherwise
@@ -100,11 +145,12 @@ def symbols_to_xor_r(symbolic_atoms, get_lit):
     return result, sorted(facts)
 
 
-def generate_random_xors(prg, files, s, q):
+def generate_random_xors(prg, files, s, q, rand=random):
     """
     Of course adding the theory may not be the best way to do it. This is just a hack
     Using the AST is a better alternative to extract the symbols to build the xor constraints.
-    In the end, we just need the symbols to write a file with random constraints. 
+    In the end, we just need the symbols to build the random constraints. 
+    Returns the random constraints as theory atoms drawn with the given generator.
     """
     for f in files:
         prg.load(f)
@@ -119,33 +165,35 @@ def generate_random_xors(prg, files, s, q):
     prg.ground([("base", [])])
 
     estimated_s = s
-    constraints = []
-    parities = []
     xors  = ""
     symbols = [atom.symbol for atom in prg.symbolic_atoms if atom.is_fact is False and "__parity" not in str(atom.symbol)]
     if len(symbols) > 0:
         if s == 0:
             estimated_s = int(log(len(symbols) + 1, 2))
         print("Random XOR constraints: %s"%estimated_s)
-        for i in range(estimated_s):
-            range_ = int((len(symbols))*q)
-            size = randint(range_, range_)
-            xors = build_theory_atoms(xors, sorted(sample(symbols, size)), randint(0,1))
-
-        file_ = open("examples/__temp_xors.lp","w")
-        file_.write(xors)
-        file_.close()
+        size = int((len(symbols))*q)
+        if _np is not None:
+            ## Draw all constraints at once, the first size columns of a random permutation per row
+            state = _np.random.RandomState(rand.randrange(2**32))
+            chosen = state.random_sample((estimated_s, len(symbols))).argsort(axis=1)[:, :size]
+            parities = state.randint(0, 2, estimated_s)
+            xors = "".join(build_theory_atoms("", [symbols[j] for j in chosen[i]], parities[i]) for i in range(estimated_s))
+        else:
+            for i in range(estimated_s):
+                xors = build_theory_atoms(xors, sorted(rand.sample(symbols, size)), rand.randint(0,1))
     return xors
 
 
-def get_xors(prg, files):
+def get_xors(prg, files, extra_text=""):
     """
-    Get XORs from encoding(s)/instance(s)
+    Get XORs from encoding(s)/instance(s) and the additional program text
     """
 
     ## Load files
     for f in files:
         prg.load(f)
+    if extra_text:
+        prg.add("base", [], extra_text)
 
     ## Theory is added when Random XORs are built.
     ## So, if not sampling, theory must be added here.
@@ -276,8 +324,40 @@ def pre_gje(xors_lits, xors_parities, all_lits, show):
                  ['c','d','e','f']]
     xors_pars = [1, 0]
     all_lits  = ['a','b','c','d','e','f','g','h']
+
+    Returns (None, None) if the constraints have no solution.
     """
+    if _np is None:
+        return _pre_gje_lists(xors_lits, xors_parities, all_lits, show)
+
+    ## Build the bit-packed matrix and the parity vector
+    cols = len(all_lits)
+    index = dict((lit, i) for i, lit in enumerate(all_lits))
+    matrix = gje.xors_to_packed_(xors_lits, index, cols)
+    parities = _np.array(xors_parities, dtype=_np.uint8)
+
+    if show:
+        print("Initial Matrix")
+        gje.print_matrix(_np.column_stack((gje.unpack_(matrix, cols), parities)).tolist())
+    rank = gje.perform_gauss_jordan_elimination_packed_(matrix, parities, cols)
+    if show:
+        print("Reduced Matrix")
+        gje.print_matrix(_np.column_stack((gje.unpack_(matrix, cols), parities)).tolist())
+
+    ## An empty row with odd parity
+    if parities[rank:].any():
+        return None, None
+
+    updated_xors = [[all_lits[i] for i in _np.flatnonzero(row)] for row in gje.unpack_(matrix, cols)]
+    updated_pars = parities.tolist()
+
+    return updated_xors, updated_pars
+
 
+def _pre_gje_lists(xors_lits, xors_parities, all_lits, show):
+    """
+    Fallback of pre_gje using plain lists if numpy is not available.
+    """
     # Build Matrix
     matrix = []
     for i in range(len(xors_parities)):
@@ -293,7 +373,8 @@ def pre_gje(xors_lits, xors_parities, all_lits, show):
     if show:
         print("Initial Matrix")
         gje.print_matrix(matrix)
-    matrix = gje.perform_gauss_jordan_elimination(matrix, False)
+    if matrix:
+        matrix = gje.perform_gauss_jordan_elimination(matrix, False)
     if show:
         print("Reduced Matrix")
         gje.print_matrix(matrix)
@@ -304,38 +385,17 @@ def pre_gje(xors_lits, xors_parities, all_lits, show):
         for i in range(len(row)-1):
             if row[i] == 1:
                 updated_row.append(all_lits[i])
+        ## An empty row with odd parity
+        if not updated_row and row[-1] == 1:
+            return None, None
         updated_pars.append(row[-1])
         updated_xors.append(updated_row)
 
     return updated_xors, updated_pars
 
 
-def write_file(fname, files, xors, add_rules):
+def strip_xors(lines):
     """
-    Rewrite input files with preprocessed parity constraints
+    Joins the given lines excluding the ones with parity constraints on them
     """
-    ## Create temp file
-    file_ = open(fname, 'w')
-
-    ## Get lines
-    lines = list(chain.from_iterable(open(f) for f in files))
-
-    ## Write lines excluding theory atoms
-    for i in range(len(lines)):
-        if "odd{" not in str(lines[i]) and "even{" not in str(lines[i]):
-            file_.write("%s"%lines[i])
-
-    ## Write XORs
-    file_.write("%s"%xors)
-
-    ## Write additional rules. e.g. choices for split
-    for rule in add_rules:
-        file_.write("%s"%rule)
-        
-    ## Close file
-    file_.close()
-
-    ## Update files list
-    files = [fname]
-    
-    return files
+    return "".join(line for line in lines if "odd{" not in line and "even{" not in line)